@@ -57,6 +57,17 @@ def _init_LuxCoreOnlineLibrary():
         os.makedirs(os.path.join(user_preferences.global_dir, 'scene', 'preview'))
 
 
+def _prefetch_LuxCoreOnlineLibrary():
+    # The asset bar can not be opened in background mode (e.g. render farm nodes)
+    if bpy.app.background:
+        return
+
+    user_preferences = utils.get_addon_preferences(bpy.context)
+    if user_preferences.use_library:
+        from ..utils.lol import utils as lol_utils
+        lol_utils.prefetch_table_of_contents(user_preferences.global_dir)
+
+
 @persistent
 def handler(_):
     """ Note: the only argument Blender passes is always None """
@@ -80,6 +91,8 @@ def handler(_):
 
         _init_LuxCoreOnlineLibrary()
 
+    _prefetch_LuxCoreOnlineLibrary()
+
     # Run converters for backwards compatibility
     compatibility.run()
 
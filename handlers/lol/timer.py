@@ -23,6 +23,7 @@
 # #####
 
 import bpy
+from ...utils.errorlog import LuxCoreErrorLog
 
 
 def timer_update():
@@ -48,13 +49,19 @@ def timer_update():
             thread.stop()
             for a in assets:
                 if a['hash'] == asset['hash']:
-                    a['downloaded'] = 100.0
+                    # A failed download can be started again by the user
+                    a['downloaded'] = 0.0 if tcom.failed else 100.0
+                    # Shown in the asset bar tooltip
+                    a['download_error'] = tcom.error if tcom.failed else ""
                     break
-            for d in tcom.passargs['downloaders']:
-                if tcom.passargs['asset type'] == 'MATERIAL':
-                    utils.append_material(bpy.context, asset, d['target_object'], d['target_slot'])
-                else:
-                    utils.link_asset(bpy.context, asset, d['location'], d['rotation'])
+            if tcom.failed:
+                LuxCoreErrorLog.add_warning('LuxCore Online Library: "%s": %s' % (asset['name'], tcom.error))
+            if not tcom.failed:
+                for d in tcom.passargs['downloaders']:
+                    if tcom.passargs['asset type'] == 'MATERIAL':
+                        utils.append_material(bpy.context, asset, d['target_object'], d['target_slot'])
+                    else:
+                        utils.link_asset(bpy.context, asset, d['location'], d['rotation'])
 
             utils.download_threads.remove(threaddata)
 
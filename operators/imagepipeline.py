@@ -53,6 +53,10 @@ crf_preset_names = [
     Portra_400VCCD
     Portra_800CD""".splitlines()
 ]
+# Enum items for the CRF preset selection, built once since the presets are static.
+# Keeping a module level reference also satisfies Blender's requirement that
+# Python keeps the strings returned from an enum callback alive.
+crf_preset_items = [(name, name.replace("_", " "), "", i) for i, name in enumerate(crf_preset_names)]
 
 
 class LUXCORE_OT_select_crf(bpy.types.Operator):
@@ -61,15 +65,8 @@ class LUXCORE_OT_select_crf(bpy.types.Operator):
     bl_description = "Camera Response Function presets"
     bl_property = "crf_preset"
 
-    callback_string = []
-
     def cb_crf_preset(self, context):
-        items = [(name, name.replace("_", " "), "", i) for i, name in enumerate(crf_preset_names)]
-        # There is a known bug with using a callback,
-        # Python must keep a reference to the strings
-        # returned or Blender will misbehave or even crash.
-        LUXCORE_OT_select_crf.callback_strings = items
-        return items
+        return crf_preset_items
 
     crf_preset: EnumProperty(name="CRF Preset",
                               description="Camera Response Function presets",
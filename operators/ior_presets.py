@@ -56,8 +56,17 @@ class LuxCoreIORPresetValues():
     # by EnumProperty when using a callback to obtain the list of items.
     default_key = "water_20C"
 
+    # Sorted lists computed by get_sorted_list(), keyed by sort mode.
+    # The presets never change, so they only have to be built once.
+    _sorted_lists = {}
+
     @classmethod
     def get_sorted_list(cls, sort="name"):
+        try:
+            return cls._sorted_lists[sort]
+        except KeyError:
+            pass
+
         # Make a deep copy of the ior_values dict
         ior_values = copy.deepcopy(cls._ior_values)
         # Append a unique integer index to each tuple. The EnumProperty needs
@@ -79,6 +88,7 @@ class LuxCoreIORPresetValues():
                            key=lambda e: e[1][index]):
             text = "{} ({:f})".format(item[1][0], item[1][1])
             preset_list.append((item[0], text, text, item[1][2]))
+        cls._sorted_lists[sort] = preset_list
         return preset_list
 
     @classmethod
@@ -129,6 +129,7 @@ def draw_callback_2d_search(self, context):
     grey = (hcolor[0] * .8, hcolor[1] * .8, hcolor[2] * .8, .5)
     white = (1, 1, 1, 0.2)
     green = (.2, 1, .2, .7)
+    red = (1, .2, .2, .7)
     highlight = (1, 1, 1, .3)
 
     # background of asset bar
@@ -204,7 +205,9 @@ def draw_callback_2d_search(self, context):
                     else:
                         ui_bgl.draw_rect(x, y, w, h, white)
 
-                    if assets[index]['downloaded'] > 0:
+                    if assets[index].get('download_error'):
+                        ui_bgl.draw_rect(x - assetbar_props.highlight_margin, y - assetbar_props.highlight_margin, w, 2, red)
+                    elif assets[index]['downloaded'] > 0:
                         ui_bgl.draw_rect(x - assetbar_props.highlight_margin, y - assetbar_props.highlight_margin, int(w * assets[index]['downloaded'] / 100.0), 2, green)
 
                     if assets[index]['patreon']:
@@ -228,6 +231,9 @@ def draw_callback_2d_search(self, context):
                     tooltip = asset['name'] + '\n\nCategory: ' + asset['category']
                     atip = ''
 
+                if asset.get('download_error'):
+                    tooltip += '\n\nDownload failed: ' + asset['download_error']
+
                 gimg = None
 
                 draw_tooltip(context, ui_props.mouse_x, ui_props.mouse_y, text=tooltip, author=atip,
@@ -23,7 +23,7 @@
 # #####
 
 import bpy
-from os.path import basename, dirname, join, isfile, splitext
+from os.path import basename, dirname
 
 from bpy.types import Operator
 from ...utils.lol import utils as utils
@@ -39,39 +39,16 @@ class LOLUpdateTOC(Operator):
         return "Update table of contents from server"
 
     def execute(self, context):
-        import urllib.request
-        import json
-
         scene = context.scene
         ui_props = scene.luxcoreOL.ui
 
         name = basename(dirname(dirname(dirname(__file__))))
         user_preferences = context.preferences.addons[name].preferences
 
-        filepath = join(user_preferences.global_dir, 'assets_model_blendermarket.json')
-        urlstr = utils.LOL_HOST_URL + "/" + utils.LOL_VERSION + "/assets_model_blendermarket.json"
-        with urllib.request.urlopen(urlstr, timeout=60) as request:
-            assets = json.load(request)
-
-            with open(filepath, 'w') as file:
-                file.write(json.dumps(assets, indent=2))
-
-        filepath = join(user_preferences.global_dir, 'assets_model.json')
-        urlstr = utils.LOL_HOST_URL + "/" + utils.LOL_VERSION + "/assets_model.json"
-        with urllib.request.urlopen(urlstr, timeout=60) as request:
-            assets = json.load(request)
-
-            with open(filepath, 'w') as file:
-                file.write(json.dumps(assets, indent=2))
-
-        filepath = join(user_preferences.global_dir, 'assets_material.json')
-        urlstr = utils.LOL_HOST_URL + "/" + utils.LOL_VERSION + "/assets_material.json"
-        with urllib.request.urlopen(urlstr, timeout=60) as request:
-            assets = json.load(request)
-
-            with open(filepath, 'w') as file:
-                file.write(json.dumps(assets, indent=2))
+        # Do not write the same files concurrently with a running prefetch
+        utils.wait_for_prefetch_table_of_contents()
+        utils.update_toc_files(user_preferences.global_dir, utils.TOC_FILENAMES)
 
         utils.download_table_of_contents(context)
         utils.load_previews(context, ui_props.asset_type)
-        return {'FINISHED'}
\ No newline at end of file
+        return {'FINISHED'}
@@ -34,7 +34,6 @@ from os.path import basename, dirname, join, isfile, splitext, exists, getsize
 import hashlib
 import tempfile
 import os
-import urllib.error
 from mathutils import Vector, Matrix
 import threading
 from threading import _MainThread, Thread, Lock
@@ -44,11 +43,47 @@ from ...utils import get_addon_preferences, compatibility
 
 LOL_HOST_URL = "https://luxcorerender.org/lol"
 LOL_VERSION = "v2.5"
+# Amount of data read from the network and written to disk at once during asset downloads
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Prefix of the directories zips are extracted to before moving the files into place,
+# and the age in seconds after which leftover staging directories are removed
+STAGING_PREFIX = ".staging_"
+STAGING_MAX_AGE = 60 * 60
+TOC_FILENAMES = ('assets_model.json', 'assets_model_blendermarket.json', 'assets_material.json')
+
+# (connect, read) timeouts in seconds for requests made through the shared session
+DOWNLOAD_TIMEOUT = (5, 60)
+THUMBNAIL_TIMEOUT = (5, 30)
 
 download_threads = []
 bg_threads = []
 stop_check_cache = False
 
+_session = None
+_session_lock = Lock()
+
+
+def get_session():
+    """
+    Return the requests session shared by all LOL downloads. Reusing it keeps the
+    connections to the server alive, so the TCP and TLS handshakes are only paid once.
+    The session is created on first use, so requests is only imported when needed.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            from requests import Session
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            _session = Session()
+            # The download timer runs up to 10 Downloader threads at once
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=10,
+                                  max_retries=Retry(total=3, backoff_factor=0.3))
+            _session.mount("https://", adapter)
+        return _session
+
+
 def load_local_TOC(context, asset_type):
     import json
 
@@ -77,46 +112,139 @@ def load_patreon_assets(context):
 
     #check if local file is available
     filepath = join(user_preferences.global_dir, 'assets_model_blendermarket.json')
-    if os.path.exists(filepath):
-        with open(filepath) as file_handle:
-            import json
-            assets = json.load(file_handle)
-            for asset in assets:
-                asset['downloaded'] = 0.0
-                asset['local'] = False
-                asset['patreon'] = True
-                asset['locked'] = True
-                filename = asset["url"]
-                filepath = join(user_preferences.global_dir, "model", splitext(filename)[0] + '.blend')
+    if not os.path.exists(filepath):
+        update_toc_file(user_preferences.global_dir, 'assets_model_blendermarket.json')
+
+    with open(filepath) as file_handle:
+        import json
+        assets = json.load(file_handle)
+        for asset in assets:
+            asset['downloaded'] = 0.0
+            asset['local'] = False
+            asset['patreon'] = True
+            asset['locked'] = True
+            filename = asset["url"]
+            filepath = join(user_preferences.global_dir, "model", splitext(filename)[0] + '.blend')
+
+            if os.path.exists(filepath):
+                asset['locked'] = False
 
-                if os.path.exists(filepath):
-                    asset['locked'] = False
-    else:
-        import urllib.request
-        urlstr = LOL_HOST_URL + "/" + LOL_VERSION + "/assets_model_blendermarket.json"
-        with urllib.request.urlopen(urlstr, timeout=60) as request:
-            import json
-            assets = json.load(request)
+    return assets
 
-            #cache file for future offline work
-            with open(filepath, 'w') as file:
-                file.write(json.dumps(assets, indent=2))
 
-            for asset in assets:
-                asset['downloaded'] = 0.0
-                asset['local'] = False
-                asset['patreon'] = True
-                asset['locked'] = True
-                filename = asset["url"]
-                filepath = join(user_preferences.global_dir, 'model', splitext(filename)[0] + '.blend')
+def update_toc_file(global_dir, filename):
+    """
+    Download a table of contents file from the server and cache it in global_dir.
+    The ETag of the previous download is stored next to the file and sent back with
+    If-None-Match, so the server can reply with 304 Not Modified and no body
+    if the cached file is still up to date.
+    """
+    import json
 
-                if os.path.exists(filepath):
-                    asset['locked'] = False
+    filepath = join(global_dir, filename)
+    etag_filepath = filepath + '.etag'
 
-    return assets
+    headers = {}
+    if isfile(filepath) and isfile(etag_filepath):
+        with open(etag_filepath) as file_handle:
+            headers['If-None-Match'] = file_handle.read().strip()
+
+    urlstr = LOL_HOST_URL + "/" + LOL_VERSION + "/" + filename
+    with get_session().get(urlstr, headers=headers, timeout=DOWNLOAD_TIMEOUT) as response:
+        if response.status_code == 304:
+            # Cached file is still up to date
+            return
+        response.raise_for_status()
+        assets = response.json()
+        etag = response.headers.get('ETag')
+
+    # cache file for future offline work. Write to a temporary file first and move it
+    # into place, so an interrupted write (e.g. Blender quitting while this runs in a
+    # background thread) can not leave a truncated table of contents behind.
+    # Every write uses its own temporary file, so concurrent updates of the same file
+    # (e.g. prefetch and the Update ToC operator) can not interleave.
+    file_descriptor, temp_filepath = tempfile.mkstemp(prefix=filename + '.', suffix='.tmp', dir=global_dir)
+    try:
+        with os.fdopen(file_descriptor, 'w') as file:
+            file.write(json.dumps(assets, indent=2))
+        os.replace(temp_filepath, filepath)
+    finally:
+        if os.path.exists(temp_filepath):
+            os.remove(temp_filepath)
+
+    if etag:
+        with open(etag_filepath, 'w') as file:
+            file.write(etag)
+    elif isfile(etag_filepath):
+        os.remove(etag_filepath)
+
+
+def update_toc_files(global_dir, filenames):
+    """
+    Download several table of contents files in parallel. The files are independent,
+    so the latency of the requests overlaps instead of adding up.
+    Re-raises the first error that occurred in one of the downloads.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if not filenames:
+        return
+
+    with ThreadPoolExecutor(max_workers=len(filenames)) as executor:
+        futures = [executor.submit(update_toc_file, global_dir, filename) for filename in filenames]
+        for future in futures:
+            future.result()
+
+
+def prefetch_table_of_contents(global_dir):
+    """
+    Download the missing table of contents files in a background thread,
+    so they are already available when the asset bar is opened for the first time.
+    """
+    global bg_threads
+    for threaddata in bg_threads:
+        tag, bg_task = threaddata
+        if tag == "prefetch_toc":
+            return
+
+    missing = [filename for filename in TOC_FILENAMES if not os.path.exists(join(global_dir, filename))]
+    if not missing:
+        return
+
+    bg_task = Thread(target=bg_prefetch_table_of_contents, args=(global_dir, missing), daemon=True)
+    bg_threads.append(["prefetch_toc", bg_task])
+    bg_task.start()
+
+
+def wait_for_prefetch_table_of_contents():
+    """ Block until a running table of contents prefetch (if any) has finished """
+    for threaddata in bg_threads[:]:
+        tag, bg_task = threaddata
+        if tag == "prefetch_toc":
+            bg_task.join()
+
+
+def bg_prefetch_table_of_contents(global_dir, filenames):
+    import requests
+    global bg_threads
+    try:
+        update_toc_files(global_dir, filenames)
+    except requests.exceptions.RequestException as error:
+        print("Connection error: Could not prefetch table of contents")
+        print(error)
+    except (OSError, ValueError) as error:
+        # Includes invalid JSON and errors while writing the cache
+        print("Could not prefetch table of contents")
+        print(error)
+    finally:
+        for threaddata in bg_threads[:]:
+            tag, bg_task = threaddata
+            if tag == "prefetch_toc":
+                bg_threads.remove(threaddata)
 
 
 def download_table_of_contents(context):
+    import requests
     global bg_threads
     scene = context.scene
     ui_props = context.scene.luxcoreOL.ui
@@ -124,41 +252,30 @@ def download_table_of_contents(context):
     user_preferences = context.preferences.addons[name].preferences
 
     try:
-        for threaddata in bg_threads:
+        for threaddata in bg_threads[:]:
             tag, bg_task = threaddata
             if tag == "check_cache":
                 global stop_check_cache
                 stop_check_cache = True
 
-        # check if local file is available
-        filepath = join(user_preferences.global_dir, 'assets_model.json')
-        if os.path.exists(filepath):
-            with open(filepath) as file_handle:
-                import json
-                assets = json.load(file_handle)
+        # Files that could not be prefetched are downloaded below
+        wait_for_prefetch_table_of_contents()
 
-                for asset in assets:
-                    asset['downloaded'] = 0.0
-                    asset['local'] = False
-                    asset['patreon'] = False
-                    asset['locked'] = False
+        # download the table of contents files that are not available locally
+        missing = [filename for filename in TOC_FILENAMES
+                   if not os.path.exists(join(user_preferences.global_dir, filename))]
+        update_toc_files(user_preferences.global_dir, missing)
 
-        else:
-            import urllib.request
-            urlstr = LOL_HOST_URL + "/" + LOL_VERSION + "/assets_model.json"
-            with urllib.request.urlopen(urlstr, timeout=60) as request:
-                import json
-                assets = json.load(request)
-                # cache file for future offline work
-                with open(filepath, 'w') as file:
-                    file.write(json.dumps(assets, indent=2))
-
-                for asset in assets:
-                    asset['downloaded'] = 0.0
-                    asset['local'] = False
-                    asset['patreon'] = False
-                    asset['locked'] = False
+        filepath = join(user_preferences.global_dir, 'assets_model.json')
+        with open(filepath) as file_handle:
+            import json
+            assets = json.load(file_handle)
 
+            for asset in assets:
+                asset['downloaded'] = 0.0
+                asset['local'] = False
+                asset['patreon'] = False
+                asset['locked'] = False
 
         assets.extend(load_local_TOC(context, 'model'))
         assets.extend(load_patreon_assets(context))
@@ -174,32 +291,15 @@ def download_table_of_contents(context):
         #     assets.extend(load_local_TOC(context, 'scene'))
         #     scene.luxcoreOL.scene['assets'] = assets
 
-        # check if local file is available
         filepath = join(user_preferences.global_dir, 'assets_material.json')
-        if os.path.exists(filepath):
-            with open(filepath) as file_handle:
-                import json
-                assets = json.load(file_handle)
-                for asset in assets:
-                    asset['downloaded'] = 0.0
-                    asset['local'] = False
-                    asset['patreon'] = False
-                    asset['locked'] = False
-        else:
-            import urllib.request
-            urlstr = LOL_HOST_URL + "/" + LOL_VERSION + "/assets_material.json"
-            with urllib.request.urlopen(urlstr, timeout=60) as request:
-                import json
-                assets = json.load(request)
-                # cache file for future offline work
-                with open(filepath, 'w') as file:
-                    file.write(json.dumps(assets, indent=2))
-
-                for asset in assets:
-                    asset['downloaded'] = 0.0
-                    asset['local'] = False
-                    asset['patreon'] = False
-                    asset['locked'] = False
+        with open(filepath) as file_handle:
+            import json
+            assets = json.load(file_handle)
+            for asset in assets:
+                asset['downloaded'] = 0.0
+                asset['local'] = False
+                asset['patreon'] = False
+                asset['locked'] = False
 
         assets.extend(load_local_TOC(context, 'material'))
         scene.luxcoreOL.material['assets'] = assets
@@ -211,20 +311,10 @@ def download_table_of_contents(context):
         bg_threads.append(["check_cache", bg_task])
         bg_task.start()
         return True
-    except ConnectionError as error:
+    except requests.exceptions.RequestException as error:
         print("Connection error: Could not download table of contents")
         print(error)
         return False
-    except urllib.error.URLError as error:
-        print("URL error: Could not download table of contents")
-        print(error)
-        return False
-
-    finally:
-        try:
-            request.close()
-        except NameError:
-            pass
 
 def init_categories(context):
     scene = context.scene
@@ -323,6 +413,8 @@ def download_file(asset_type, asset, location, rotation, target_object, target_s
 
     tcom = is_downloading(asset)
     if tcom is None:
+        # Clear the error of a previous failed attempt
+        asset['download_error'] = ""
         tcom = ThreadCom()
         tcom.passargs['downloaders'] = [downloader]
         tcom.passargs['asset type'] = asset_type
@@ -354,7 +446,8 @@ class Downloader(threading.Thread):
 
     # def main_download_thread(asset_data, tcom, scene_id, api_key):
     def run(self):
-        import urllib.request
+        import requests
+        import zipfile
         user_preferences = get_addon_preferences(bpy.context)
         tcom = self.tcom
 
@@ -363,18 +456,20 @@ class Downloader(threading.Thread):
         with tempfile.TemporaryDirectory() as temp_dir_path:
             temp_zip_path = os.path.join(temp_dir_path, filename)
             url = LOL_HOST_URL + "/" + tcom.passargs['asset type'].lower() + "/" + filename
+            # Only cleared once the asset was extracted and verified successfully
+            tcom.failed = True
             try:
                 print("Downloading:", url)
-                with urllib.request.urlopen(url, timeout=60) as url_handle, \
+                with get_session().get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response, \
                         open(temp_zip_path, "wb") as file_handle:
-                    total_length = url_handle.headers.get('Content-Length')
-                    tcom.file_size = int(total_length)
+                    response.raise_for_status()
+                    total_length = response.headers.get('Content-Length')
+                    if total_length:
+                        tcom.file_size = int(total_length)
 
                     dl = 0
-                    data = url_handle.read(8192)
-                    file_handle.write(data)
-                    while len(data) == 8192:
-                        data = url_handle.read(8192)
+                    for data in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        file_handle.write(data)
                         dl += len(data)
                         tcom.downloaded = dl
                         tcom.progress = int(100 * tcom.downloaded / tcom.file_size)
@@ -385,32 +480,103 @@ class Downloader(threading.Thread):
                                 if not thread.is_alive():
                                     self.stop()
 
-                        file_handle.write(data)
                         if self.stopped():
-                            url_handle.close()
+                            tcom.error = "Download cancelled"
                             return
                 print("Download finished")
-                import zipfile
-                with zipfile.ZipFile(temp_zip_path) as zf:
-                    print("Extracting zip to", os.path.join(user_preferences.global_dir, tcom.passargs['asset type'].lower()))
-                    zf.extractall(os.path.join(user_preferences.global_dir, tcom.passargs['asset type'].lower()))
+                target_dir = os.path.join(user_preferences.global_dir, tcom.passargs['asset type'].lower())
+                print("Extracting zip to", target_dir)
+                blend_filename = splitext(filename)[0] + '.blend'
+                if extract_zip_staged(temp_zip_path, target_dir, {blend_filename: self.asset["hash"]}):
+                    tcom.failed = False
+                else:
+                    tcom.error = "Hash mismatch, downloaded file is corrupt"
+                    print("Hash mismatch: Downloaded file " + filename + " is corrupt")
 
-            except TimeoutError as error:
+            except requests.exceptions.Timeout as error:
+                tcom.error = "Download timed out"
                 print("TimeoutError error: Could not download " + filename)
                 print(error)
-            except urllib.error.URLError as error:
+            except requests.exceptions.RequestException as error:
+                tcom.error = "Could not download: " + str(error)
                 print("Could not download: " + filename)
+                print(error)
+            except zipfile.BadZipFile as error:
+                tcom.error = "Downloaded zip is corrupt"
+                print("Corrupt zip: Could not extract " + filename)
+                print(error)
+            except OSError as error:
+                tcom.error = "Could not extract: " + str(error)
+                print("Could not extract: " + filename)
+                print(error)
 
             finally:
                 tcom.finished = True
 
 
+def remove_stale_staging_dirs(target_dir):
+    """
+    Remove staging directories left behind in target_dir, e.g. when Blender was killed
+    during an extraction. Only directories older than STAGING_MAX_AGE are removed, so the
+    staging directories of downloads that are still running are not touched.
+    """
+    import shutil
+    import time
+
+    now = time.time()
+    for entry in os.scandir(target_dir):
+        if not entry.is_dir() or not entry.name.startswith(STAGING_PREFIX):
+            continue
+        try:
+            if now - entry.stat().st_mtime > STAGING_MAX_AGE:
+                shutil.rmtree(entry.path)
+        except OSError as error:
+            print("Could not remove stale staging directory", entry.path)
+            print(error)
+
+
+def extract_zip_staged(zip_path, target_dir, expected_hashes=None):
+    """
+    Extract the zip file into a staging directory inside target_dir and move the
+    extracted files into place afterwards. Because staging and target are on the same
+    volume, os.replace() is an atomic rename, so an asset file in target_dir is never
+    visible in a half-written state, even if the extraction fails.
+
+    expected_hashes optionally maps file paths (relative to the zip root) to their
+    sha256 hex digest. If a file is missing or its hash does not match, nothing is
+    moved into target_dir and False is returned.
+    """
+    import zipfile
+
+    os.makedirs(target_dir, exist_ok=True)
+    remove_stale_staging_dirs(target_dir)
+
+    with tempfile.TemporaryDirectory(prefix=STAGING_PREFIX, dir=target_dir) as staging_dir:
+        with zipfile.ZipFile(zip_path) as zf:
+            zf.extractall(staging_dir)
+
+        if expected_hashes:
+            for relative_path, expected_hash in expected_hashes.items():
+                filepath = os.path.join(staging_dir, relative_path)
+                if not os.path.isfile(filepath) or calc_hash(filepath) != expected_hash:
+                    return False
+
+        for root, dirs, files in os.walk(staging_dir):
+            dest_root = os.path.normpath(os.path.join(target_dir, os.path.relpath(root, staging_dir)))
+            os.makedirs(dest_root, exist_ok=True)
+            for file in files:
+                os.replace(os.path.join(root, file), os.path.join(dest_root, file))
+    return True
+
+
 class ThreadCom:  # object passed to threads to read background process stdout info
     def __init__(self):
         self.file_size = 1000000000000000  # property that gets written to.
         self.downloaded = 0
         self.progress = 0.0
         self.finished = False
+        self.failed = False
+        self.error = ""  # Reason of the failure, shown to the user
         self.passargs = {}
 
 
@@ -686,8 +852,8 @@ def bg_load_previews(context, asset_type):
 
 
 def bg_download_thumbnails(context, download_queue):
-    from requests import Session
-    session = Session()
+    import requests
+    session = get_session()
 
     name = basename(dirname(dirname(dirname(__file__))))
     user_preferences = context.preferences.addons[name].preferences
@@ -706,7 +872,13 @@ def bg_download_thumbnails(context, download_queue):
 
         print("Downloading ", imagename)
         url = LOL_HOST_URL + "/"+ asset_type.lower() +"/preview/" + imagename
-        with session.get(url) as resp, open(tpath, "wb") as file_handle:
+        try:
+            resp = session.get(url, timeout=THUMBNAIL_TIMEOUT)
+        except requests.exceptions.RequestException as error:
+            print("Download error ", error, ": ", url)
+            continue
+
+        with resp, open(tpath, "wb") as file_handle:
             if resp.status_code == 200:
                 file_handle.write(resp.content)
 